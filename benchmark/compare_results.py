@@ -3,7 +3,7 @@
 RTTM vs RTTR Benchmark Comparison Script
 
 Usage:
-    python compare_results.py <rttm_output.txt> <rttr_output.txt>
+    python compare_results.py <rttm_output.txt> <rttr_output.txt> [--format text|json|markdown|csv]
     
 Or run benchmarks and compare:
     ./rttm_benchmark --benchmark_format=json > rttm.json
@@ -12,38 +12,73 @@ Or run benchmarks and compare:
 """
 
 import sys
+import argparse
+import csv
 import json
 import re
+import functools
+import statistics
+import types
+from collections import defaultdict
 
-# Benchmark mapping: RTTM name -> RTTR name
-BENCHMARK_MAP = {
-    "RTTM_TypeLookup_Static": "RTTR_TypeLookup_Static",
-    "RTTM_TypeLookup_Dynamic": "RTTR_TypeLookup_Dynamic",
-    "RTTM_ObjectCreation_Simple": "RTTR_ObjectCreation_Simple",
-    "RTTM_ObjectCreation_Complex": "RTTR_ObjectCreation_Complex",
-    "RTTM_PropertyRead_Dynamic": "RTTR_PropertyRead_Dynamic",
-    "RTTM_PropertyWrite_Dynamic": "RTTR_PropertyWrite_Dynamic",
-    "RTTM_PropertyAccess_Multiple": "RTTR_PropertyAccess_Multiple",
-    "RTTM_PropertyAccess_Deep": "RTTR_PropertyAccess_Deep",
-    "RTTM_MethodCall_NoArgs": "RTTR_MethodCall_NoArgs",
-    "RTTM_MethodCall_WithArg": "RTTR_MethodCall_WithArg",
-    "RTTM_MethodCall_ComplexReturn": "RTTR_MethodCall_ComplexReturn",
-    "RTTM_FullPath_PropertyAccess": "RTTR_FullPath_PropertyAccess",
-    "RTTM_FullPath_MethodCall": "RTTR_FullPath_MethodCall",
-    "RTTM_FullPath_CreateAndAccess": "RTTR_FullPath_CreateAndAccess",
-    "RTTM_Batch_Creation": "RTTR_Batch_Creation",
-    "RTTM_Batch_PropertyAccess": "RTTR_Batch_PropertyAccess",
-    "RTTM_Batch_MethodCalls": "RTTR_Batch_MethodCalls",
-    "RTTM_PropertyEnumeration": "RTTR_PropertyEnumeration",
-    "RTTM_MethodEnumeration": "RTTR_MethodEnumeration",
-}
+# Benchmark names shared by both suites, without the RTTM_/RTTR_ prefix
+BENCHMARKS = (
+    "TypeLookup_Static",
+    "TypeLookup_Dynamic",
+    "ObjectCreation_Simple",
+    "ObjectCreation_Complex",
+    "PropertyRead_Dynamic",
+    "PropertyWrite_Dynamic",
+    "PropertyAccess_Multiple",
+    "PropertyAccess_Deep",
+    "MethodCall_NoArgs",
+    "MethodCall_WithArg",
+    "MethodCall_ComplexReturn",
+    "FullPath_PropertyAccess",
+    "FullPath_MethodCall",
+    "FullPath_CreateAndAccess",
+    "Batch_Creation",
+    "Batch_PropertyAccess",
+    "Batch_MethodCalls",
+    "PropertyEnumeration",
+    "MethodEnumeration",
+)
+
+# Benchmark name prefix -> category, tried in order (first match wins)
+CATEGORY_PREFIXES = (
+    ("TypeLookup", "Type Lookup"),
+    ("ObjectCreation", "Object Creation"),
+    ("PropertyEnumeration", "Enumeration"),
+    ("MethodEnumeration", "Enumeration"),
+    ("Property", "Property Access"),
+    ("MethodCall", "Method Invocation"),
+    ("FullPath", "Full Reflection Path"),
+    ("Batch", "Batch Operations"),
+)
+
+@functools.lru_cache(maxsize=None)
+def category_indices():
+    """Group BENCHMARKS indices by category, in order of first appearance"""
+    buckets = defaultdict(list)
+    for i, suffix in enumerate(BENCHMARKS):
+        for prefix, category in CATEGORY_PREFIXES:
+            if suffix.startswith(prefix):
+                buckets[category].append(i)
+                break
+    # Read-only view, since the cached mapping is shared by every caller
+    return types.MappingProxyType({category: tuple(indices) for category, indices in buckets.items()})
+
+# Matches lines like: BenchmarkName    123 ns    456 ns    789
+_LINE_RE = re.compile(r'^(\w+)\s+([\d.]+)\s+ns\s+([\d.]+)\s+ns\s+(\d+)')
+
+# Row layout for the comparison table: name, RTTM time, RTTR time, winner
+ROW_FMT = "{:<35} {:>12.2f} {:>12.2f} {:>25}\n"
 
 def parse_benchmark_output(text):
     """Parse Google Benchmark text output"""
     results = {}
-    for line in text.split('\n'):
-        # Match lines like: BenchmarkName    123 ns    456 ns    789
-        match = re.match(r'^(\w+)\s+([\d.]+)\s+ns\s+([\d.]+)\s+ns\s+(\d+)', line)
+    for line in text.splitlines():
+        match = _LINE_RE.match(line)
         if match:
             name = match.group(1)
             time_ns = float(match.group(2))
@@ -51,118 +86,146 @@ def parse_benchmark_output(text):
     return results
 
 def format_speedup(rttm_time, rttr_time):
-    """Format speedup ratio"""
-    if rttm_time < rttr_time:
-        ratio = rttr_time / rttm_time
-        return f"RTTM {ratio:.2f}x faster"
-    else:
-        ratio = rttm_time / rttr_time
-        return f"RTTR {ratio:.2f}x faster"
+    """Format speedup ratio, returning (rttm_is_faster, text)"""
+    rttm_faster = rttm_time < rttr_time
+    ratio = max(rttm_time, rttr_time) / min(rttm_time, rttr_time)
+    return rttm_faster, f"{('RTTR', 'RTTM')[rttm_faster]} {ratio:.2f}x faster"
 
-def main():
-    # Hardcoded results from the benchmark runs
-    rttm_results = {
-        "RTTM_TypeLookup_Static": 0.611,
-        "RTTM_TypeLookup_Dynamic": 21.0,
-        "RTTM_ObjectCreation_Simple": 40.1,
-        "RTTM_ObjectCreation_Complex": 31.7,
-        "RTTM_PropertyRead_Dynamic": 10.2,
-        "RTTM_PropertyWrite_Dynamic": 12.1,
-        "RTTM_PropertyAccess_Multiple": 24.1,
-        "RTTM_PropertyAccess_Deep": 43.9,
-        "RTTM_MethodCall_NoArgs": 13.8,
-        "RTTM_MethodCall_WithArg": 12.6,
-        "RTTM_MethodCall_ComplexReturn": 12.8,
-        "RTTM_FullPath_PropertyAccess": 30.5,
-        "RTTM_FullPath_MethodCall": 32.1,
-        "RTTM_FullPath_CreateAndAccess": 72.6,
-        "RTTM_Batch_Creation": 3661,
-        "RTTM_Batch_PropertyAccess": 1010,
-        "RTTM_Batch_MethodCalls": 1124,
-        "RTTM_PropertyEnumeration": 8.28,
-        "RTTM_MethodEnumeration": 13.6,
-    }
-    
-    rttr_results = {
-        "RTTR_TypeLookup_Static": 0.606,
-        "RTTR_TypeLookup_Dynamic": 11.1,
-        "RTTR_ObjectCreation_Simple": 76.1,
-        "RTTR_ObjectCreation_Complex": 76.7,
-        "RTTR_PropertyRead_Dynamic": 14.9,
-        "RTTR_PropertyWrite_Dynamic": 4.82,
-        "RTTR_PropertyAccess_Multiple": 103,
-        "RTTR_PropertyAccess_Deep": 74.2,
-        "RTTR_MethodCall_NoArgs": 15.3,
-        "RTTR_MethodCall_WithArg": 7.68,
-        "RTTR_MethodCall_ComplexReturn": 30.9,
-        "RTTR_FullPath_PropertyAccess": 38.1,
-        "RTTR_FullPath_MethodCall": 43.6,
-        "RTTR_FullPath_CreateAndAccess": 142,
-        "RTTR_Batch_Creation": 11134,
-        "RTTR_Batch_PropertyAccess": 1630,
-        "RTTR_Batch_MethodCalls": 1669,
-        "RTTR_PropertyEnumeration": 50.0,
-        "RTTR_MethodEnumeration": 73.2,
-    }
+def present_benchmarks(results, prefix):
+    """Return the BENCHMARKS suffixes that have a positive time under prefix"""
+    return {suffix for suffix in BENCHMARKS if results.get(prefix + suffix, 0) > 0}
+
+def load_results(path):
+    """Load benchmark results from Google Benchmark JSON or text output"""
+    with open(path) as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError:
+            f.seek(0)
+            return parse_benchmark_output(f.read())
+    # Complexity rows (_BigO/_RMS) carry no real_time; errored runs are
+    # dropped so they show up as missing
+    return {b["name"]: b["real_time"] for b in data["benchmarks"]
+            if "real_time" in b and not b.get("error_occurred")}
+
+def compare(rttm_results, rttr_results):
+    """Compare both result sets, returning (rows, categories)"""
+    # Only compare benchmarks with a positive time in both result sets
+    valid = present_benchmarks(rttm_results, "RTTM_") & present_benchmarks(rttr_results, "RTTR_")
+    missing = [suffix for suffix in BENCHMARKS if suffix not in valid]
+    if missing:
+        print(f"Warning: missing results for {', '.join(missing)}", file=sys.stderr)
     
-    print("=" * 90)
-    print("RTTM vs RTTR Benchmark Comparison")
-    print("=" * 90)
-    print()
-    print(f"{'Benchmark':<35} {'RTTM (ns)':>12} {'RTTR (ns)':>12} {'Winner':>25}")
-    print("-" * 90)
+    # Align both result sets with BENCHMARKS order
+    rget = rttm_results.get
+    gget = rttr_results.get
+    rttm_times = [rget("RTTM_" + suffix) if suffix in valid else 0 for suffix in BENCHMARKS]
+    rttr_times = [gget("RTTR_" + suffix) if suffix in valid else 0 for suffix in BENCHMARKS]
     
-    rttm_wins = 0
-    rttr_wins = 0
+    rows = []
+    for suffix, rttm_time, rttr_time in zip(BENCHMARKS, rttm_times, rttr_times):
+        if suffix in valid:
+            is_rttm, winner = format_speedup(rttm_time, rttr_time)
+            rows.append({
+                "benchmark": suffix,
+                "rttm_ns": rttm_time,
+                "rttr_ns": rttr_time,
+                "rttm_faster": is_rttm,
+                "winner": winner,
+            })
     
-    for rttm_name, rttr_name in BENCHMARK_MAP.items():
-        rttm_time = rttm_results.get(rttm_name, 0)
-        rttr_time = rttr_results.get(rttr_name, 0)
-        
-        if rttm_time and rttr_time:
-            winner = format_speedup(rttm_time, rttr_time)
-            if "RTTM" in winner:
-                rttm_wins += 1
-            else:
-                rttr_wins += 1
-            
-            # Clean up benchmark name for display
-            display_name = rttm_name.replace("RTTM_", "")
-            print(f"{display_name:<35} {rttm_time:>12.2f} {rttr_time:>12.2f} {winner:>25}")
+    # Geometric mean of per-benchmark time ratios, so a single slow benchmark
+    # does not dominate its category
+    categories = []
+    for cat_name, indices in category_indices().items():
+        ratios = [rttm_times[i] / rttr_times[i] for i in indices if BENCHMARKS[i] in valid]
+        if not ratios:
+            continue
+        ratio = statistics.geometric_mean(ratios)
+        is_rttm, winner = format_speedup(ratio, 1.0)
+        categories.append({
+            "category": cat_name,
+            "time_ratio": ratio,
+            "rttm_faster": is_rttm,
+            "winner": winner,
+        })
     
-    print("-" * 90)
-    print()
-    print(f"Summary: RTTM wins {rttm_wins}, RTTR wins {rttr_wins}")
-    print()
+    return rows, categories
+
+def render_text(rows, categories, rttm_wins, rttr_wins):
+    """Render the comparison as a plain-text report"""
+    out = []
+    out.append("=" * 90 + "\n")
+    out.append("RTTM vs RTTR Benchmark Comparison\n")
+    out.append("=" * 90 + "\n")
+    out.append("\n")
+    out.append(f"{'Benchmark':<35} {'RTTM (ns)':>12} {'RTTR (ns)':>12} {'Winner':>25}\n")
+    out.append("-" * 90 + "\n")
+    for row in rows:
+        out.append(ROW_FMT.format(row["benchmark"], row["rttm_ns"], row["rttr_ns"], row["winner"]))
+    out.append("-" * 90 + "\n")
+    out.append("\n")
+    out.append(f"Summary: RTTM wins {rttm_wins}, RTTR wins {rttr_wins}\n")
+    out.append("\n")
     
     # Category analysis
-    print("=" * 90)
-    print("Category Analysis")
-    print("=" * 90)
+    out.append("=" * 90 + "\n")
+    out.append("Category Analysis (geometric mean)\n")
+    out.append("=" * 90 + "\n")
+    for cat in categories:
+        out.append(f"{cat['category']:<25}: {cat['winner']}\n")
+    return "".join(out)
+
+def render_markdown(rows, categories, rttm_wins, rttr_wins):
+    """Render the comparison as Markdown tables"""
+    out = []
+    out.append("| Benchmark | RTTM (ns) | RTTR (ns) | Winner |\n")
+    out.append("|---|---:|---:|---|\n")
+    for row in rows:
+        out.append(f"| {row['benchmark']} | {row['rttm_ns']:.2f} | {row['rttr_ns']:.2f} | {row['winner']} |\n")
+    out.append("\n")
+    out.append(f"**Summary:** RTTM wins {rttm_wins}, RTTR wins {rttr_wins}\n")
+    out.append("\n")
+    out.append("| Category | Winner (geometric mean) |\n")
+    out.append("|---|---|\n")
+    for cat in categories:
+        out.append(f"| {cat['category']} | {cat['winner']} |\n")
+    return "".join(out)
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Compare RTTM and RTTR benchmark results")
+    parser.add_argument("rttm", help="RTTM benchmark output (Google Benchmark JSON or text)")
+    parser.add_argument("rttr", help="RTTR benchmark output (Google Benchmark JSON or text)")
+    parser.add_argument("--format", default="text", choices=["text", "json", "markdown", "csv"],
+                        help="output format (default: text)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    rttm_results = load_results(args.rttm)
+    rttr_results = load_results(args.rttr)
     
-    categories = {
-        "Type Lookup": ["TypeLookup_Static", "TypeLookup_Dynamic"],
-        "Object Creation": ["ObjectCreation_Simple", "ObjectCreation_Complex"],
-        "Property Access": ["PropertyRead_Dynamic", "PropertyWrite_Dynamic", 
-                          "PropertyAccess_Multiple", "PropertyAccess_Deep"],
-        "Method Invocation": ["MethodCall_NoArgs", "MethodCall_WithArg", "MethodCall_ComplexReturn"],
-        "Full Reflection Path": ["FullPath_PropertyAccess", "FullPath_MethodCall", "FullPath_CreateAndAccess"],
-        "Batch Operations": ["Batch_Creation", "Batch_PropertyAccess", "Batch_MethodCalls"],
-        "Enumeration": ["PropertyEnumeration", "MethodEnumeration"],
-    }
+    rows, categories = compare(rttm_results, rttr_results)
+    rttm_wins = sum(row["rttm_faster"] for row in rows)
+    rttr_wins = len(rows) - rttm_wins
     
-    for cat_name, benchmarks in categories.items():
-        rttm_total = sum(rttm_results.get(f"RTTM_{b}", 0) for b in benchmarks)
-        rttr_total = sum(rttr_results.get(f"RTTR_{b}", 0) for b in benchmarks)
-        
-        if rttm_total < rttr_total:
-            ratio = rttr_total / rttm_total
-            winner = f"RTTM {ratio:.2f}x faster"
-        else:
-            ratio = rttm_total / rttr_total
-            winner = f"RTTR {ratio:.2f}x faster"
-        
-        print(f"{cat_name:<25}: {winner}")
+    if args.format == "json":
+        json.dump({
+            "rows": rows,
+            "categories": categories,
+            "summary": {"rttm_wins": rttm_wins, "rttr_wins": rttr_wins},
+        }, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    elif args.format == "csv":
+        writer = csv.writer(sys.stdout, lineterminator="\n")
+        writer.writerow(["benchmark", "rttm_ns", "rttr_ns", "winner"])
+        writer.writerows((row["benchmark"], row["rttm_ns"], row["rttr_ns"], row["winner"]) for row in rows)
+    elif args.format == "markdown":
+        sys.stdout.write(render_markdown(rows, categories, rttm_wins, rttr_wins))
+    else:
+        sys.stdout.write(render_text(rows, categories, rttm_wins, rttr_wins))
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -9,20 +9,146 @@ import argparse
 import clang.cindex
 from clang.cindex import CursorKind, TypeKind, StorageClass
 import json
+import hashlib
 import tempfile
+import multiprocessing
+import functools
 from collections import defaultdict
 
 
+# 标准库实现使用的命名空间，其中不会有需要反射的类型，遍历时整体跳过
+SYSTEM_NAMESPACES = frozenset({'std', '__gnu_cxx', '__cxxabiv1'})
+
+# 常用的光标类型集合
+TYPE_DECL_KINDS = frozenset({CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL, CursorKind.ENUM_DECL})
+RECORD_KINDS = frozenset({CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL})
+TEMPLATE_PARAM_KINDS = frozenset({CursorKind.TEMPLATE_TYPE_PARAMETER, CursorKind.TEMPLATE_NON_TYPE_PARAMETER})
+MEMBER_KINDS = frozenset({CursorKind.FIELD_DECL, CursorKind.CXX_METHOD, CursorKind.CONSTRUCTOR})
+
+# 不会是也不会包含类型声明的光标类型（引用、属性、预处理记录），遍历时直接跳过
+NON_DECL_KINDS = frozenset(kind for kind in CursorKind.get_all_kinds()
+                           if kind.is_reference() or kind.is_attribute() or kind.is_preprocessing())
+
+def normalize_path(path):
+    """规范化文件路径并驻留字符串，同一文件的路径共享同一对象，集合查找时可直接比较引用"""
+    return sys.intern(os.path.normpath(str(path)))
+
+
+# 每个进程共享的clang索引，进程池中的工作进程处理多个头文件时复用
+shared_index = None
+
+
+def get_shared_index():
+    """获取当前进程共享的clang索引，首次使用时创建"""
+    global shared_index
+    if shared_index is None:
+        shared_index = clang.cindex.Index.create()
+    return shared_index
+
+
+def init_worker():
+    """进程池工作进程的初始化函数：不使用从父进程 fork 过来的clang索引，首次使用时重新创建"""
+    global shared_index
+    shared_index = None
+
+
+# 生成器脚本本身的哈希，每个进程只计算一次
+script_hash = None
+
+
+def get_script_hash():
+    """获取生成器脚本的哈希，脚本修改后所有缓存自动失效"""
+    global script_hash
+    if script_hash is None:
+        with open(os.path.abspath(__file__), 'rb') as f:
+            script_hash = hashlib.sha256(f.read()).hexdigest()
+    return script_hash
+
+
+# libclang 库及其 Python 绑定的标识，每个进程只计算一次
+libclang_stamp = None
+
+
+def get_libclang_stamp():
+    """获取 libclang 库和 Python 绑定的路径、修改时间和大小，升级 libclang 后所有缓存自动失效"""
+    global libclang_stamp
+    if libclang_stamp is None:
+        parts = []
+        for path in (clang.cindex.conf.lib._name, clang.cindex.__file__):
+            try:
+                st = os.stat(path)
+                parts.append(f"{os.path.abspath(path)}:{st.st_mtime_ns}:{st.st_size}")
+            except OSError:
+                # 通过系统搜索路径加载的库只有文件名，无法获取状态
+                parts.append(str(path))
+        libclang_stamp = "\0".join(parts)
+    return libclang_stamp
+
+
+class TypeNameCorrector:
+    """修正类型名称字符串，尝试将其简单名称部分替换为已知的FQN，处理 const, 指针(*), 引用(&)"""
+
+    # 拆分为 const 前缀、主类型名和末尾的引用/指针后缀（只取最后一个*或&，右值引用优先）
+    TYPE_NAME_PATTERN = re.compile(r'^(const\s+)?(.*?)\s*(&&|&|\*)?$', re.DOTALL)
+
+    def __init__(self, self_ref_name, fully_qualified_name, local_namespace_types):
+        # 当前类的简单名称及其FQN，用于替换自引用类型
+        self.self_ref_name = self_ref_name
+        self.fully_qualified_name = fully_qualified_name
+        # simple_name -> FQN 的类型查找表
+        self.local_namespace_types = local_namespace_types
+        # 同一个类中的类型字符串大量重复，缓存修正结果
+        self.cache = {}
+
+    def correct(self, type_name):
+        """修正单个类型名称字符串，如 "const MyType&", "MyType *", "MyType" """
+        corrected = self.cache.get(type_name)
+        if corrected is None:
+            corrected = self.cache[type_name] = self.compute(type_name)
+        return corrected
+
+    def compute(self, type_name):
+        """执行实际的类型名称修正"""
+        if not type_name:
+            return ""
+
+        match = self.TYPE_NAME_PATTERN.match(type_name)
+        prefix = "const " if match.group(1) else ""
+        main_part = match.group(2)
+        suffix = match.group(3) or ""
+
+        # 如果核心类型名已包含 "::"，则认为它已经是限定名或来自std等已知命名空间
+        if "::" in main_part:
+            return type_name
+
+        # 检查是否是自引用 (当前类的简单名称)
+        if main_part == self.self_ref_name:
+            return prefix + self.fully_qualified_name + suffix
+
+        # 检查是否与 local_namespace_types 中的已知类型匹配
+        if main_part in self.local_namespace_types:
+            return prefix + self.local_namespace_types[main_part] + suffix
+
+        # 如果没有找到匹配，则返回原始的、可能未完全限定的名称。基本类型如 "int" 会落到这里。
+        return type_name
+
+
 class ReflectionGenerator:
-    def __init__(self, output_file, compile_options_file=None, include_paths=None):
+    def __init__(self, output_file, compile_options_file=None, include_paths=None, use_cache=True):
         """初始化反射代码生成器"""
         self.output_file = output_file
         self.compile_options_file = compile_options_file
         self.include_paths = include_paths or []
-        self.index = clang.cindex.Index.create()
+        self.index = get_shared_index()
+
+        # 解析结果缓存目录，None 表示禁用缓存
+        self.cache_dir = None
+        if use_cache:
+            cache_root = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+            self.cache_dir = os.path.join(cache_root, 'rttm_reflection')
 
-        # 按命名空间组织的注册代码
-        self.namespace_registrations = defaultdict(list)
+        # 按命名空间组织的注册代码: {命名空间: {完全限定名: 注册代码}}，按注册顺序排列，同一类型只保留一份
+        self.namespace_registrations = defaultdict(dict)
 
         # 记录已处理的源文件
         self.processed_files = set()
@@ -30,6 +156,11 @@ class ReflectionGenerator:
         # 记录无法解析的外部类型
         self.external_types = set()
 
+        # 由外部类型名称编译出的匹配模式，用于检查成员类型中是否引用了外部类型
+        self.external_type_pattern = None
+        # 构建匹配模式时外部类型的数量，用于判断模式是否已过期
+        self.external_type_pattern_size = 0
+
         # 记录成功解析的类型
         self.resolved_types = set()
 
@@ -42,11 +173,29 @@ class ReflectionGenerator:
         # 存储所有类型的信息字典，用于后续处理
         self.type_infos = {}
 
-        # 跟踪当前的访问修饰符状态
-        self.current_access_state = {}
+        # 收集到的类型的简单名称到完全限定名的映射，用于修正成员类型名称
+        self.simple_to_fqn = {}
+
+        # 按光标哈希缓存的限定名前缀、命名空间路径、访问权限表和模板类判断结果，每个翻译单元重新计算
+        self.scope_prefix_cache = {}
+        self.namespace_path_cache = {}
+        self.access_map_cache = {}
+        self.template_class_cache = {}
+
+        # 源文件名到规范化路径的缓存，跨翻译单元共用
+        self.file_path_cache = {}
+
+        # 已加载的编译选项，None 表示尚未加载
+        self.compile_options = None
+
+        # 共享的预编译头文件选项，None 表示解析时自行构建
+        self.pch_options = None
 
     def load_compile_options(self):
-        """从编译选项文件加载选项"""
+        """从编译选项文件加载选项，只在首次调用时读取文件"""
+        if self.compile_options is not None:
+            return list(self.compile_options)
+
         # 基础选项
         options = ['-x', 'c++', '-std=c++17']
 
@@ -64,9 +213,9 @@ class ReflectionGenerator:
 
         if self.compile_options_file and os.path.exists(self.compile_options_file):
             try:
-                # 首先尝试读取JSON格式
                 with open(self.compile_options_file, 'r') as f:
-                    try:
+                    if self.compile_options_file.endswith('.json'):
+                        # JSON格式
                         data = json.load(f)
                         if isinstance(data, list):
                             for item in data:
@@ -77,9 +226,8 @@ class ReflectionGenerator:
                                 if isinstance(item, str) and not item.startswith('#'):
                                     options.append(item)
                         print(f"从JSON文件 {self.compile_options_file} 加载了编译选项")
-                    except json.JSONDecodeError:
-                        # 不是JSON格式，回退到按行读取
-                        f.seek(0)
+                    else:
+                        # 文本格式，按行读取
                         for line in f:
                             line = line.strip()
                             if line and not line.startswith('#'):  # 忽略注释
@@ -89,7 +237,8 @@ class ReflectionGenerator:
                 print(f"加载编译选项文件 {self.compile_options_file} 失败: {e}", file=sys.stderr)
 
         print(f"使用总共 {len(options)} 个编译选项")
-        return options
+        self.compile_options = options
+        return list(options)
 
     def create_pch_file(self):
         """创建预编译头文件来处理外部库引用"""
@@ -131,23 +280,242 @@ class ReflectionGenerator:
         os.close(fd)
         return pch_file
 
+    def build_pch(self, options):
+        """将存根头文件编译为预编译头，返回 (临时文件列表, 解析头文件时附加的编译选项)"""
+        stub_file = self.create_pch_file()
+        try:
+            tu = self.index.parse(stub_file, options,
+                                  options=clang.cindex.TranslationUnit.PARSE_INCOMPLETE |
+                                          clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES)
+            # 存根解析出错时生成的PCH会破坏后续解析（例如找不到编译器内置头文件），退回到直接包含存根
+            if any(diag.severity >= clang.cindex.Diagnostic.Error for diag in tu.diagnostics):
+                return [stub_file], [f'-include{stub_file}']
+            pch_file = os.path.splitext(stub_file)[0] + '.pch'
+            tu.save(pch_file)
+        except Exception as e:
+            print(f"构建预编译头失败，直接包含存根头文件: {e}", file=sys.stderr)
+            return [stub_file], [f'-include{stub_file}']
+
+        # PCH 会校验存根源文件，因此存根需要保留到解析结束
+        return [stub_file, pch_file], ['-include-pch', pch_file]
+
+    def remove_pch_files(self, pch_files):
+        """删除临时的预编译头文件"""
+        for pch_file in pch_files:
+            try:
+                os.unlink(pch_file)
+            except OSError:
+                pass
+
+    def get_cache_key(self, header_file, options, processed_files):
+        """根据脚本、libclang、编译选项、已处理的头文件和头文件内容计算缓存键"""
+        h = hashlib.sha256()
+        h.update(get_script_hash().encode('utf-8'))
+        h.update(b"\0")
+        h.update(get_libclang_stamp().encode('utf-8'))
+        h.update(b"\0")
+        h.update("\0".join(options).encode('utf-8'))
+        h.update(b"\0")
+        # 已处理的头文件会被视为项目内文件，影响类型的收集结果
+        h.update("\0".join(sorted(processed_files)).encode('utf-8'))
+        h.update(b"\0")
+        h.update(os.path.normpath(header_file).encode('utf-8'))
+        h.update(b"\0")
+        with open(header_file, 'rb') as f:
+            h.update(f.read())
+        return h.hexdigest()
+
+    def get_file_stamp(self, path):
+        """获取文件的修改时间和大小，用于校验缓存依赖"""
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size]
+
+    def export_result(self):
+        """导出处理结果，用于合并到其他生成器或写入缓存"""
+        return {
+            'namespace_registrations': {ns: dict(regs) for ns, regs in self.namespace_registrations.items()},
+            'external_types': sorted(self.external_types),
+            'resolved_types': sorted(self.resolved_types),
+            'skipped_types': list(self.skipped_types),
+            'processed_files': sorted(self.processed_files),
+        }
+
+    def merge_result(self, result):
+        """合并其他生成器导出的处理结果，已注册的类型不会重复注册"""
+        for namespace, registrations in result['namespace_registrations'].items():
+            for fully_qualified_name, code in registrations.items():
+                if fully_qualified_name not in self.registered_types:
+                    self.registered_types.add(fully_qualified_name)
+                    self.namespace_registrations[namespace].setdefault(fully_qualified_name, code)
+        self.external_types.update(result['external_types'])
+        self.resolved_types.update(result['resolved_types'])
+        self.skipped_types.extend(result['skipped_types'])
+        self.processed_files.update(result['processed_files'])
+
+    def read_cached_result(self, cache_key):
+        """读取缓存的处理结果，缓存不存在或已失效时返回None"""
+        cache_file = os.path.join(self.cache_dir, f"{cache_key}.json")
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # 任何被包含的文件发生变化都视为缓存失效
+        try:
+            for path, stamp in entry['dependencies'].items():
+                if self.get_file_stamp(path) != stamp:
+                    return None
+        except OSError:
+            return None
+        return entry
+
+    def load_cached_result(self, cache_key, header_file):
+        """从缓存加载头文件的处理结果，命中时合并到当前状态并返回True"""
+        entry = self.read_cached_result(cache_key)
+        if entry is None:
+            return False
+
+        self.merge_result(entry)
+
+        print(f"使用缓存的解析结果: {header_file}")
+        return True
+
+    def save_cached_result(self, cache_key, tu, pch_options):
+        """将头文件的处理结果写入缓存"""
+        try:
+            # 记录所有被包含文件的状态（临时PCH存根除外）
+            dependencies = {}
+            for path in [tu.spelling] + [str(inc.include.name) for inc in tu.get_includes()]:
+                if f'-include{path}' not in pch_options and path not in dependencies:
+                    dependencies[path] = self.get_file_stamp(path)
+
+            entry = self.export_result()
+            entry['dependencies'] = dependencies
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_file = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_file, os.path.join(self.cache_dir, f"{cache_key}.json"))
+        except Exception as e:
+            print(f"写入解析缓存失败: {e}", file=sys.stderr)
+
+    def process_headers(self, headers, jobs=None):
+        """处理头文件列表，每个头文件在独立的生成器中处理（可并行），再按列表顺序合并结果"""
+        # 每个头文件都把列表中排在它之前的头文件视为已处理；外部类型名称则只来自该头文件自身的解析，
+        # 不受其他头文件影响，因此结果与并行度和缓存无关
+        tasks = []
+        processed_files = sorted(self.processed_files)
+        for header in headers:
+            tasks.append((list(processed_files), header))
+            processed_files.append(normalize_path(header))
+
+        # 编译选项只加载一次
+        options = self.load_compile_options()
+
+        # 先在主进程中查找缓存，只有未命中的头文件才需要构建预编译头和解析
+        results = [None] * len(tasks)
+        missed = []
+        for i, (processed_files, header) in enumerate(tasks):
+            if self.cache_dir:
+                try:
+                    entry = self.read_cached_result(self.get_cache_key(header, options, processed_files))
+                except OSError:
+                    entry = None  # 头文件不可读，交给解析流程报告错误
+                if entry is not None:
+                    print(f"使用缓存的解析结果: {header}")
+                    results[i] = (True, entry)
+                    continue
+            missed.append(i)
+
+        # 多个头文件共用同一个预编译头，只构建一次
+        pch_files = []
+        pch_options = self.pch_options
+        if pch_options is None and len(missed) > 1:
+            pch_files, pch_options = self.build_pch(options)
+
+        # 所有头文件共用的参数只绑定一次
+        task_func = functools.partial(process_header_task, self.output_file, self.compile_options_file,
+                                      self.include_paths, self.cache_dir is not None, options, pch_options)
+
+        try:
+            missed_tasks = [tasks[i] for i in missed]
+            jobs = min(jobs or os.cpu_count() or 1, len(missed_tasks))
+            if jobs > 1:
+                # 按提交顺序取回结果，保证合并顺序（以及生成的文件）与串行处理一致
+                with multiprocessing.Pool(jobs, initializer=init_worker) as pool:
+                    missed_results = pool.imap(task_func, missed_tasks)
+                    for i, result in zip(missed, missed_results):
+                        results[i] = result
+            else:
+                for i, result in zip(missed, map(task_func, missed_tasks)):
+                    results[i] = result
+
+            success = True
+            for header, (ok, result) in zip(headers, results):
+                self.merge_result(result)
+                if not ok:
+                    success = False
+                    print(f"警告: 处理 {header} 时出现错误", file=sys.stderr)
+            return success
+        finally:
+            self.remove_pch_files(pch_files)
+
+    def process_headers_single_tu(self, headers):
+        """将所有头文件包含到一个总头文件中，只解析一个翻译单元，所有列出的头文件都视为项目内文件"""
+        # 总头文件放在输出文件旁边，路径固定且内容不变时不重写，解析结果缓存才能命中
+        umbrella_file = f"{self.output_file}.umbrella.hpp"
+        # 包含路径与 processed_files 使用同一个绝对路径，libclang 报告的正是该路径
+        header_paths = [normalize_path(os.path.abspath(header)) for header in headers]
+        umbrella_content = "".join(f"#include \"{header_path}\"\n" for header_path in header_paths)
+        try:
+            with open(umbrella_file, 'r') as f:
+                up_to_date = f.read() == umbrella_content
+        except OSError:
+            up_to_date = False
+        if not up_to_date:
+            with open(umbrella_file, 'w') as f:
+                f.write(umbrella_content)
+
+        self.processed_files.update(header_paths)
+        success = self.process_header(umbrella_file)
+
+        # 总头文件只是解析入口，不应出现在生成代码的包含列表中
+        self.processed_files.discard(normalize_path(umbrella_file))
+        return success
+
     def process_header(self, header_file):
-        """处理单个头文件"""
+        """处理单个头文件（缓存的是整个生成器的结果，因此应在新建的生成器上调用）"""
         # 加载编译选项
         options = self.load_compile_options()
 
-        # 创建预编译头文件
-        pch_file = self.create_pch_file()
-        options.append(f'-include{pch_file}')
+        # 命中缓存时跳过clang解析
+        cache_key = None
+        if self.cache_dir:
+            try:
+                cache_key = self.get_cache_key(header_file, options, self.processed_files)
+            except OSError as e:
+                # 头文件不可读时不使用缓存，交给下面的解析流程报告错误
+                print(f"警告: 无法读取 {header_file}，跳过缓存: {e}", file=sys.stderr)
+            else:
+                if self.load_cached_result(cache_key, header_file):
+                    return True
+
+        # 使用共享的预编译头文件，没有时自行构建
+        pch_files = []
+        pch_options = self.pch_options
+        if pch_options is None:
+            pch_files, pch_options = self.build_pch(options)
+        options.extend(pch_options)
 
         print(f"正在解析头文件: {header_file}")
 
         try:
-            # 使用不完全解析模式
+            # 使用不完全解析模式；不需要宏展开等预处理记录
             tu = self.index.parse(header_file, options,
                                   options=clang.cindex.TranslationUnit.PARSE_INCOMPLETE |
-                                          clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES |
-                                          clang.cindex.TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD)
+                                          clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES)
 
             # 记录诊断信息，但不立即退出
             has_errors = False
@@ -167,76 +535,52 @@ class ReflectionGenerator:
                 print(f"解析 {header_file} 时发现警告，将尝试提取可识别的类型...", file=sys.stderr)
 
             # 记录处理的文件
-            self.processed_files.add(os.path.normpath(header_file))
+            self.processed_files.add(normalize_path(header_file))
 
-            # 清空类型信息和访问状态
+            # 清空类型信息和光标缓存
             self.type_infos = {}
-            self.current_access_state = {}
-
-            # 第一阶段：递归扫描所有类型，记录访问状态
-            self.scan_and_record_access(tu.cursor)
+            self.scope_prefix_cache = {}
+            self.namespace_path_cache = {}
+            self.access_map_cache = {}
+            self.template_class_cache = {}
 
-            # 第二阶段：收集所有类型及其信息
+            # 第一阶段：遍历语法树，收集所有类型及其访问状态
             self.collect_all_types(tu.cursor)
 
-            # 第三阶段：筛选出真正公开的类型
+            # 第二阶段：筛选出真正公开的类型
             self.filter_public_types()
 
-            # 第四阶段：处理符合条件的类型
+            # 第三阶段：处理符合条件的类型
             self.process_filtered_types()
 
+            if cache_key:
+                self.save_cached_result(cache_key, tu, pch_options)
+
             return True
         except Exception as e:
             print(f"解析 {header_file} 异常: {e}", file=sys.stderr)
             return False
         finally:
             # 删除临时PCH文件
-            try:
-                os.unlink(pch_file)
-            except:
-                pass
-
-    def scan_and_record_access(self, cursor):
-        """扫描并记录所有类和结构体的访问状态"""
-        # 生成唯一标识
-        cursor_id = str(cursor.hash)
+            self.remove_pch_files(pch_files)
 
-        if cursor.kind in [CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL]:
-            # 设置默认访问状态
-            if cursor.kind == CursorKind.CLASS_DECL:
-                current_access = clang.cindex.AccessSpecifier.PRIVATE
-            else:  # 结构体默认是public
-                current_access = clang.cindex.AccessSpecifier.PUBLIC
-
-            # 记录该类/结构体的当前访问状态
-            self.current_access_state[cursor_id] = current_access
-
-            # 处理类/结构体的子节点，记录访问修饰符和成员
-            for child in cursor.get_children():
-                if child.kind == CursorKind.CXX_ACCESS_SPEC_DECL:
-                    # 更新当前访问状态
-                    self.current_access_state[cursor_id] = child.access_specifier
-                elif child.kind in [CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL, CursorKind.ENUM_DECL]:
-                    # 记录成员类型的父级访问状态
-                    child_id = str(child.hash)
-                    self.current_access_state[child_id] = self.current_access_state.get(cursor_id,
-                                                                                        clang.cindex.AccessSpecifier.PUBLIC)
-
-                    # 递归处理嵌套类型
-                    self.scan_and_record_access(child)
-
-        # 递归处理其他节点
-        for child in cursor.get_children():
-            if child.kind not in [CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL]:
-                self.scan_and_record_access(child)
+    def get_file_path(self, location_file):
+        """获取源文件的规范化路径，每个文件只计算一次"""
+        file_name = location_file.name
+        file_path = self.file_path_cache.get(file_name)
+        if file_path is None:
+            file_path = normalize_path(file_name)
+            self.file_path_cache[file_name] = file_path
+        return file_path
 
     def is_external_type(self, cursor):
         """判断是否是外部库类型"""
         # 如果没有文件信息，可能是外部类型
-        if not cursor.location.file:
+        location_file = cursor.location.file
+        if not location_file:
             return True
 
-        file_path = os.path.normpath(str(cursor.location.file.name))
+        file_path = self.get_file_path(location_file)
 
         # 不在处理文件列表中的认为是外部类型
         if file_path not in self.processed_files:
@@ -246,6 +590,20 @@ class ReflectionGenerator:
 
         return False
 
+    def build_external_type_pattern(self):
+        """将所有外部类型名称编译为一个正则表达式，一次扫描即可判断是否包含任一外部类型"""
+        # 较长的名称排在前面；排序也使模式与集合的迭代顺序无关
+        names = sorted(self.external_types, key=lambda t: (-len(t), t))
+        self.external_type_pattern = re.compile("|".join(map(re.escape, names))) if names else None
+        self.external_type_pattern_size = len(self.external_types)
+
+    def references_external_type(self, type_str):
+        """判断类型字符串中是否包含外部类型名称"""
+        # 外部类型只增不减，数量变化说明有新的外部类型（如 process_enum 中记录的），需要重新构建模式
+        if self.external_type_pattern_size != len(self.external_types):
+            self.build_external_type_pattern()
+        return self.external_type_pattern is not None and self.external_type_pattern.search(type_str) is not None
+
     def is_static_member(self, cursor):
         """判断是否是静态成员"""
         # 对于字段，检查存储类别
@@ -266,13 +624,16 @@ class ReflectionGenerator:
             return True
 
         # 检查类名是否包含模板参数但不是特化
-        if '<' in cursor.spelling and '>' in cursor.spelling:
-            # 检查是否有模板参数（非特化）
-            for child in cursor.get_children():
-                if child.kind == CursorKind.TEMPLATE_TYPE_PARAMETER or child.kind == CursorKind.TEMPLATE_NON_TYPE_PARAMETER:
-                    return True
+        spelling = cursor.spelling
+        if '<' not in spelling or '>' not in spelling:
+            return False
 
-        return False
+        # 检查是否有模板参数（非特化），结果按光标缓存
+        is_template = self.template_class_cache.get(cursor.hash)
+        if is_template is None:
+            is_template = any(child.kind in TEMPLATE_PARAM_KINDS for child in cursor.get_children())
+            self.template_class_cache[cursor.hash] = is_template
+        return is_template
 
     def is_template_specialization(self, cursor):
         """判断是否是模板特化"""
@@ -287,158 +648,187 @@ class ReflectionGenerator:
 
         return False
 
-    def get_effective_access(self, cursor):
-        """获取节点的有效访问修饰符，手动检查嵌套结构体是否在 private/protected 块中"""
-        # 1. 如果不是嵌套类型（全局/命名空间级别），默认 public
-        parent = cursor.semantic_parent
-        if not parent or parent.kind not in (CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL):
-            return clang.cindex.AccessSpecifier.PUBLIC
-
-        # 2. 遍历父类的子节点，查找最近的访问修饰符
-        current_access = (
-            clang.cindex.AccessSpecifier.PRIVATE  # class 默认 private
-            if parent.kind == CursorKind.CLASS_DECL
-            else clang.cindex.AccessSpecifier.PUBLIC  # struct 默认 public
-        )
-
-        # 查找 cursor 是否在 private/protected 块中
-        found_cursor = False
-        for child in parent.get_children():
-            if child.kind == CursorKind.CXX_ACCESS_SPEC_DECL:
-                # 更新当前访问权限（遇到 private:/public:/protected:）
-                current_access = child.access_specifier
-            elif child == cursor:
-                # 找到当前节点，返回最近的访问修饰符
-                found_cursor = True
-                break
-
-        # 如果找到 cursor，返回最近的访问修饰符；否则返回默认值
-        return current_access if found_cursor else (
-            clang.cindex.AccessSpecifier.PRIVATE if parent.kind == CursorKind.CLASS_DECL
-            else clang.cindex.AccessSpecifier.PUBLIC
-        )
-
-    def is_truly_public(self, cursor):
-        """检查一个类型是否真正是公开的（考虑所有父级）"""
-        current = cursor
-
-        # 向上检查所有父级
-        while current and current.kind != CursorKind.TRANSLATION_UNIT:
-            # 对于类和结构体，检查访问修饰符
-            if current.kind in [CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL, CursorKind.ENUM_DECL]:
-                access = self.get_effective_access(current)
-                if access != clang.cindex.AccessSpecifier.PUBLIC:
-                    return False
-
-            # 移动到父级
-            current = current.semantic_parent
-
-        return True
+    def build_access_map(self, parent):
+        """一次遍历类/结构体的子节点，记录每个子节点所在的访问修饰符块，结果按父级光标缓存"""
+        access_map = self.access_map_cache.get(parent.hash)
+        if access_map is None:
+            current_access = (
+                clang.cindex.AccessSpecifier.PRIVATE  # class 默认 private
+                if parent.kind == CursorKind.CLASS_DECL
+                else clang.cindex.AccessSpecifier.PUBLIC  # struct 默认 public
+            )
+            access_map = {}
+            for child in parent.get_children():
+                if child.kind == CursorKind.CXX_ACCESS_SPEC_DECL:
+                    # 更新当前访问权限（遇到 private:/public:/protected:）
+                    current_access = child.access_specifier
+                else:
+                    access_map[child.hash] = current_access
+            self.access_map_cache[parent.hash] = access_map
+        return access_map
+
+    def get_scope_prefix(self, cursor):
+        """获取作用域的限定名前缀（以::结尾），包括所有父类和命名空间，结果按光标缓存"""
+        if cursor is None or cursor.kind == CursorKind.TRANSLATION_UNIT:
+            return ""
+
+        prefix = self.scope_prefix_cache.get(cursor.hash)
+        if prefix is None:
+            prefix = self.get_scope_prefix(cursor.semantic_parent)
+            # 只处理命名的父级，忽略匿名命名空间和匿名类型
+            if cursor.spelling and 'unnamed' not in cursor.spelling:
+                prefix += cursor.spelling + "::"
+            self.scope_prefix_cache[cursor.hash] = prefix
+        return prefix
 
     def get_qualified_name(self, cursor):
         """获取光标的完全限定名称，包括所有父类和命名空间"""
-        name_parts = []
-        current = cursor
-
         # 获取当前类型的名称
         if self.is_template_specialization(cursor):
-            name_parts.append(cursor.displayname)
+            name = cursor.displayname
         else:
-            name_parts.append(cursor.spelling)
+            name = cursor.spelling
 
-        # 向上遍历父级，收集所有的父类型和命名空间
-        parent = cursor.semantic_parent
-        while parent and parent.kind != CursorKind.TRANSLATION_UNIT:
-            # 只处理命名的父级，忽略匿名命名空间和匿名类型
-            if parent.spelling and 'unnamed' not in parent.spelling:
-                name_parts.insert(0, parent.spelling)
-            parent = parent.semantic_parent
-
-        return "::".join(name_parts)
+        return self.get_scope_prefix(cursor.semantic_parent) + name
 
     def get_namespace_path(self, cursor):
-        """获取光标所在的命名空间路径（不包括父类）"""
-        namespaces = []
+        """获取光标所在的命名空间路径（不包括父类），结果按父级光标缓存"""
         parent = cursor.semantic_parent
+        if parent is None or parent.kind != CursorKind.NAMESPACE:
+            return ""
 
-        # 向上遍历父级，收集所有命名空间
-        while parent and parent.kind == CursorKind.NAMESPACE:
+        path = self.namespace_path_cache.get(parent.hash)
+        if path is None:
+            path = self.get_namespace_path(parent)
             if parent.spelling:  # 只处理命名的命名空间，忽略匿名命名空间
-                namespaces.insert(0, parent.spelling)
-            parent = parent.semantic_parent
+                path = f"{path}::{parent.spelling}" if path else parent.spelling
+            self.namespace_path_cache[parent.hash] = path
+        return path
+
+    def get_child_entries(self, cursor, cursor_kind, parent_public):
+        """按声明顺序列出子节点（及其类型）和访问修饰符，返回逆序列表以便压栈"""
+        # class 默认 private，struct 默认 public；其他父级下的节点视为 public
+        track_access = cursor_kind in RECORD_KINDS
+        if cursor_kind == CursorKind.CLASS_DECL:
+            access = clang.cindex.AccessSpecifier.PRIVATE
+        else:
+            access = clang.cindex.AccessSpecifier.PUBLIC
 
-        return "::".join(namespaces) if namespaces else ""
+        entries = []
+        for child in cursor.get_children():
+            kind = child.kind
+            if kind in NON_DECL_KINDS:
+                continue
+            if kind == CursorKind.CXX_ACCESS_SPEC_DECL:
+                # 遇到 private:/public:/protected: 时更新当前访问权限
+                if track_access:
+                    access = child.access_specifier
+                continue
+            entries.append((child, kind, cursor, access, parent_public))
+        entries.reverse()
+        return entries
 
     def collect_all_types(self, cursor):
-        """递归收集所有类型信息"""
-        # 递归遍历所有子节点
-        for child in cursor.get_children():
+        """单次遍历语法树，收集所有类型信息，同时计算访问权限和公开状态"""
+        # 记录每个类/结构体是否真正公开，供类外定义的嵌套类型使用
+        truly_public_by_hash = {}
+
+        # 栈元素: (节点, 节点类型, 词法父节点, 节点在父级中的访问权限, 父级是否真正公开)
+        # 节点类型在列出子节点时已读取，随节点压栈，避免反复通过libclang查询
+        stack = self.get_child_entries(cursor, cursor.kind, True)
+        while stack:
+            child, kind, lexical_parent, access, parent_public = stack.pop()
+
             # 只处理当前文件中的定义
-            if child.location.file:
-                file_path = os.path.normpath(str(child.location.file.name))
-                if file_path not in self.processed_files:
+            location_file = child.location.file
+            if location_file:
+                if self.get_file_path(location_file) not in self.processed_files:
                     # 记录外部类型
-                    if child.kind in [CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL, CursorKind.ENUM_DECL]:
+                    if kind in TYPE_DECL_KINDS:
                         self.external_types.add(child.spelling)
                     # 不再往下处理外部文件
                     continue
 
-            # 处理类型定义
-            if child.kind in [CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL, CursorKind.ENUM_DECL]:
-                # 获取类型名称
-                type_name = child.displayname if self.is_template_specialization(child) else child.spelling
-                if not type_name or 'unnamed' in type_name:
-                    # 跳过未命名类型
-                    continue
+            # 跳过标准库命名空间（例如头文件中为 std 添加的特化）
+            if kind == CursorKind.NAMESPACE and child.spelling in SYSTEM_NAMESPACES:
+                continue
 
-                # 跳过普通模板类
-                if self.is_template_class(child) and not self.is_template_specialization(child):
-                    self.skipped_types.append(f"{type_name} (普通模板类)")
-                    print(f"跳过普通模板类: {type_name}")
-                    continue
+            # 非类型节点：继续遍历子节点，公开状态沿用父级
+            if kind not in TYPE_DECL_KINDS:
+                stack.extend(self.get_child_entries(child, kind, parent_public))
+                continue
 
-                # 跳过外部类型
-                if self.is_external_type(child):
-                    self.external_types.add(type_name)
-                    continue
+            # 在成员或 typedef 声明中定义的类型（如 struct P {...} p;）会经由该声明再被访问一次，
+            # 已收集过的类型及其子节点不再重复处理
+            if child.hash in truly_public_by_hash:
+                continue
 
-                # 获取父节点，确定访问权限上下文
-                parent = child.semantic_parent
-                parent_is_class = parent.kind == CursorKind.CLASS_DECL if parent else False
-                parent_is_struct = parent.kind == CursorKind.STRUCT_DECL if parent else False
-
-                # 获取有效的访问修饰符
-                access = self.get_effective_access(child)
-
-                # 检查是否真正是公开的
-                is_public = access == clang.cindex.AccessSpecifier.PUBLIC
-
-                # 获取完全限定名
-                qualified_name = self.get_qualified_name(child)
-
-                # 存储类型信息
-                self.type_infos[qualified_name] = {
-                    'cursor': child,
-                    'name': type_name,
-                    'qualified_name': qualified_name,
-                    'parent': parent,
-                    'parent_is_class': parent_is_class,
-                    'parent_is_struct': parent_is_struct,
-                    'access': access,
-                    'is_public': is_public,
-                    'is_truly_public': self.is_truly_public(child),
-                    'is_template': self.is_template_class(child),
-                    'is_specialization': self.is_template_specialization(child),
-                    'namespace': self.get_namespace_path(child)
-                }
-
-                # 调试信息
-                access_str = "PUBLIC" if is_public else "PRIVATE/PROTECTED"
-                parent_str = f"{parent.spelling}({parent.kind})" if parent else "全局"
-                print(f"收集类型: {qualified_name}, 访问权限: {access_str}, 父级: {parent_str}")
-
-            # 继续递归处理子节点
-            self.collect_all_types(child)
+            # 获取类型名称
+            type_name = child.displayname if self.is_template_specialization(child) else child.spelling
+            if not type_name or 'unnamed' in type_name:
+                # 跳过未命名类型
+                continue
+
+            # 跳过普通模板类
+            if self.is_template_class(child) and not self.is_template_specialization(child):
+                self.skipped_types.append(f"{type_name} (普通模板类)")
+                print(f"跳过普通模板类: {type_name}")
+                continue
+
+            # 跳过外部类型
+            if self.is_external_type(child):
+                self.external_types.add(type_name)
+                continue
+
+            # 获取父节点，确定访问权限上下文
+            parent = child.semantic_parent
+            parent_kind = parent.kind if parent else None
+            parent_is_class = parent_kind == CursorKind.CLASS_DECL
+            parent_is_struct = parent_kind == CursorKind.STRUCT_DECL
+
+            # 词法父级不是语义父级时，从父类的访问权限表中查找；类外定义的嵌套类型
+            # （如 struct Outer::Inner {...}）不在父类的子节点中，使用父类的默认访问权限。
+            # 公开状态取自父类
+            if parent and parent != lexical_parent:
+                if parent_kind in RECORD_KINDS:
+                    default_access = (clang.cindex.AccessSpecifier.PRIVATE if parent_is_class
+                                      else clang.cindex.AccessSpecifier.PUBLIC)
+                    access = self.build_access_map(parent).get(child.hash, default_access)
+                else:
+                    access = clang.cindex.AccessSpecifier.PUBLIC
+                parent_public = truly_public_by_hash.get(parent.hash, True)
+
+            # 检查是否真正是公开的（当前及所有父级都是公开的）
+            is_public = access == clang.cindex.AccessSpecifier.PUBLIC
+            is_truly_public = parent_public and is_public
+            truly_public_by_hash[child.hash] = is_truly_public
+
+            # 获取完全限定名：父级作用域前缀已缓存，直接拼接已算出的类型名称
+            qualified_name = self.get_scope_prefix(parent) + type_name
+
+            # 存储类型信息
+            self.type_infos[qualified_name] = {
+                'cursor': child,
+                'name': type_name,
+                'qualified_name': qualified_name,
+                'parent': parent,
+                'parent_is_class': parent_is_class,
+                'parent_is_struct': parent_is_struct,
+                'access': access,
+                'is_public': is_public,
+                'is_truly_public': is_truly_public,
+                'is_template': self.is_template_class(child),
+                'is_specialization': self.is_template_specialization(child),
+                'namespace': self.get_namespace_path(child)
+            }
+
+            # 调试信息
+            access_str = "PUBLIC" if is_public else "PRIVATE/PROTECTED"
+            parent_str = f"{parent.spelling}({parent_kind})" if parent else "全局"
+            print(f"收集类型: {qualified_name}, 访问权限: {access_str}, 父级: {parent_str}")
+
+            # 继续遍历嵌套类型
+            stack.extend(self.get_child_entries(child, kind, is_truly_public))
 
     def filter_public_types(self):
         """过滤出真正公开的类型"""
@@ -450,11 +840,27 @@ class ReflectionGenerator:
                 self.type_infos.pop(name)
                 continue
 
+    def build_simple_to_fqn(self):
+        """从所有收集到的类型构建 simple_name -> FQN 映射，每个翻译单元只构建一次"""
+        self.simple_to_fqn = {}
+        for fqn_collected_type in self.type_infos.keys():  # self.type_infos 的键是收集到的类型的FQN
+            simple_name_collected = fqn_collected_type.split("::")[-1]
+
+            # 对于模板类型如 "MyClass<int>"，我们希望简单名称是 "MyClass" 作为键
+            if '<' in simple_name_collected:
+                simple_name_collected = simple_name_collected.split("<")[0]
+
+            # 如果简单名称发生冲突（例如不同命名空间下的同名类型），
+            # 这里的基本策略是先收集到的优先。在更复杂的场景下可能需要更精细的策略。
+            if simple_name_collected not in self.simple_to_fqn:
+                self.simple_to_fqn[simple_name_collected] = fqn_collected_type
+
     def process_filtered_types(self):
         """处理过滤后的类型"""
+        self.build_simple_to_fqn()
         for name, info in self.type_infos.items():
             cursor = info['cursor']
-            if cursor.kind in [CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL]:
+            if cursor.kind in RECORD_KINDS:
                 self.process_class(cursor)
             elif cursor.kind == CursorKind.ENUM_DECL:
                 self.process_enum(cursor)
@@ -489,8 +895,9 @@ class ReflectionGenerator:
 
     def process_class(self, cursor):
         """处理类或结构体"""
-        # 获取类名，对于模板特化使用displayname
-        if self.is_template_specialization(cursor):
+        # 获取类名，对于模板特化使用displayname（是否为模板特化只判断一次，后面复用）
+        is_specialization = self.is_template_specialization(cursor)
+        if is_specialization:
             class_name = cursor.displayname
         else:
             class_name = cursor.spelling
@@ -501,7 +908,7 @@ class ReflectionGenerator:
 
         # 跳过模板类（但不跳过模板特化）
         if cursor.kind == CursorKind.CLASS_TEMPLATE or (
-                self.is_template_class(cursor) and not self.is_template_specialization(cursor)):
+                self.is_template_class(cursor) and not is_specialization):
             # self.skipped_types.append(f"{class_name} (普通模板类)") # 此信息已在collect_all_types中记录
             return
 
@@ -510,8 +917,8 @@ class ReflectionGenerator:
             # self.external_types.add(class_name) # 此信息已在collect_all_types中记录
             return
 
-        # 获取完全限定名
-        fully_qualified_name = self.get_qualified_name(cursor)
+        # 获取完全限定名：与 get_qualified_name 相同，直接使用已算出的类名
+        fully_qualified_name = self.get_scope_prefix(cursor.semantic_parent) + class_name
 
         # 保存简单类名（用于后续替换自引用类型）
         # simple_class_name 用于 correct_type_name 中的自引用检查
@@ -528,64 +935,60 @@ class ReflectionGenerator:
         # 记录类型已被注册 (实际应在成功生成代码后添加，此处提前仅为逻辑占位)
         # self.registered_types.add(fully_qualified_name) # 移至实际生成代码后
 
+        # 先查看访问权限表（一次遍历并缓存）：没有任何子节点处于 public 块中时
+        # （包括仅有前置声明、没有子节点的情况），不可能有可反射成员，直接跳过
+        access_map = self.build_access_map(cursor)
+        if clang.cindex.AccessSpecifier.PUBLIC not in access_map.values():
+            self.skipped_types.append(f"{fully_qualified_name} (无公开可反射成员)")
+            return
+
         properties = []
         methods = []
         constructors = []
 
-        # --- 修改开始: 为 correct_type_name 构建更全面的类型查找表 ---
-        # local_namespace_types 将包含从 self.type_infos (所有收集到的类型) 中提取的 simple_name -> FQN 映射
-        local_namespace_types = {}
-        for fqn_collected_type in self.type_infos.keys():  # self.type_infos 的键是收集到的类型的FQN
-            simple_name_collected = fqn_collected_type.split("::")[-1]
-
-            # 对于模板类型如 "MyClass<int>"，我们希望简单名称是 "MyClass" 作为键
-            if '<' in simple_name_collected:
-                simple_name_collected = simple_name_collected.split("<")[0]
-
-            # 如果简单名称发生冲突（例如不同命名空间下的同名类型），
-            # 这里的基本策略是先收集到的优先。在更复杂的场景下可能需要更精细的策略。
-            if simple_name_collected not in local_namespace_types:
-                local_namespace_types[simple_name_collected] = fqn_collected_type
-        # --- 修改结束 ---
-
         # 收集类中的成员和方法
         for member in cursor.get_children():
-            access = self.get_effective_access(member)
+            # 成员类型和名称只读取一次；只有字段、方法和构造函数需要查询访问权限
+            kind = member.kind
+            if kind not in MEMBER_KINDS:
+                continue
+            access = access_map.get(member.hash)  # 成员的语义父级就是本类，直接查表
             if access == clang.cindex.AccessSpecifier.PUBLIC and not self.is_static_member(member):
-                if member.kind == CursorKind.FIELD_DECL:
+                member_name = member.spelling
+                if kind == CursorKind.FIELD_DECL:
                     field_type_from_clang = self.get_fully_qualified_type(member.type)  # 使用您脚本中已有的辅助函数
-                    is_external = any(ext_type in field_type_from_clang for ext_type in self.external_types)
+                    is_external = self.references_external_type(field_type_from_clang)
                     if not is_external:
-                        properties.append(member.spelling)
-                elif member.kind == CursorKind.CXX_METHOD:
-                    if member.spelling != class_name and not member.spelling.startswith('~'):
-                        return_type_str = member.result_type.spelling  # 原始字符串
-                        param_types_str_list = [param.type.spelling for param in member.get_arguments()]  # 原始字符串列表
+                        properties.append(member_name)
+                elif kind == CursorKind.CXX_METHOD:
+                    if member_name != class_name and not member_name.startswith('~'):
+                        return_type_str = sys.intern(member.result_type.spelling)  # 原始字符串（驻留，重复的类型名共享同一对象）
+                        param_types_str_list = [sys.intern(param.type.spelling) for param in member.get_arguments()]  # 原始字符串列表
                         is_const_method = member.is_const_method()
 
                         # 检查原始类型字符串中是否有外部类型 (简单检查)
                         is_external = False
-                        if any(ext_type in return_type_str for ext_type in self.external_types):
+                        if self.references_external_type(return_type_str):
                             is_external = True
                         if not is_external:
                             for pt_str in param_types_str_list:
-                                if any(ext_type in pt_str for ext_type in self.external_types):
+                                if self.references_external_type(pt_str):
                                     is_external = True
                                     break
 
                         if not is_external:
                             methods.append({
-                                'name': member.spelling,
+                                'name': member_name,
                                 'return_type_orig': return_type_str,  # 存储原始，待修正
                                 'param_types_orig': param_types_str_list,  # 存储原始，待修正
                                 'is_const': is_const_method
                             })
-                elif member.kind == CursorKind.CONSTRUCTOR:
+                elif kind == CursorKind.CONSTRUCTOR:
                     param_types_str_list = []
                     is_external = False
                     for param in member.get_arguments():
-                        type_str = param.type.spelling  # 原始字符串
-                        if any(ext_type in type_str for ext_type in self.external_types):
+                        type_str = sys.intern(param.type.spelling)  # 原始字符串（驻留）
+                        if self.references_external_type(type_str):
                             is_external = True
                             break
                         param_types_str_list.append(type_str)
@@ -604,69 +1007,15 @@ class ReflectionGenerator:
 
         # 准备生成注册代码
         short_name_for_comment = class_name.split('<')[0] if '<' in class_name else class_name
-        registration = f"    // {short_name_for_comment} ({fully_qualified_name}) 类的反射注册\n"
-        registration += f"    Registry_<{fully_qualified_name}>()\n"
+        registration_parts = [f"    // {short_name_for_comment} ({fully_qualified_name}) 类的反射注册\n"]
+        registration_parts.append(f"    Registry_<{fully_qualified_name}>()\n")
 
         for prop in properties:
-            registration += f"        .property(\"{prop}\", &{fully_qualified_name}::{prop})\n"
-
-        # ======================================================================
-        # 完整 的 correct_type_name 嵌套函数定义 (使用 local_namespace_types)
-        # ======================================================================
-        def correct_type_name(type_name_str_to_correct):
-            """
-            修正类型名称字符串，尝试将其简单名称部分替换为已知的FQN。
-            处理 const, 指针(*), 引用(&)。
-            """
-            original_full_str = type_name_str_to_correct  # 例如 "const MyType&", "MyType *", "MyType"
-
-            if not type_name_str_to_correct:
-                return ""
-
-            # 提取前缀 (const), 后缀 (*, &), 和主类型名
-            prefix = ""
-            suffix = ""
-            main_part = type_name_str_to_correct
-
-            if main_part.startswith("const "):
-                prefix = "const "
-                main_part = main_part[len("const "):].strip()
-
-            # 处理后缀，注意可能有多个指针，但通常只有一个引用
-            # 这个简化处理只取最后一个*或&
-            if main_part.endswith("&&"):  # 右值引用优先
-                suffix = "&&"
-                main_part = main_part[:-2].strip()
-            elif main_part.endswith("&"):  # 左值引用
-                suffix = "&"
-                main_part = main_part[:-1].strip()
-            elif main_part.endswith("*"):  # 指针
-                suffix = "*"
-                main_part = main_part[:-1].strip()
-
-            # main_part 现在应该是核心类型名，如 "CommandPool", "int", "std::vector<int>"
-
-            # 如果核心类型名已包含 "::"，则认为它已经是限定名或来自std等已知命名空间
-            if "::" in main_part:
-                return original_full_str  # 直接返回原始字符串，因为假定它已ok或来自外部(如std::)
-
-            # 检查是否是自引用 (当前类的简单名称)
-            # simple_class_name_for_self_ref 来自外部 process_class 方法作用域
-            if main_part == simple_class_name_for_self_ref:
-                return prefix + fully_qualified_name + suffix  # fully_qualified_name 是当前类的FQN
-
-            # 检查是否与 local_namespace_types 中的已知类型匹配
-            # local_namespace_types 来自外部 process_class 方法作用域
-            if main_part in local_namespace_types:
-                return prefix + local_namespace_types[main_part] + suffix
-
-            # 如果没有找到匹配，并且它不是基本类型 (这里简单判断，更复杂的可能需要类型检查)
-            # 则返回原始的、可能未完全限定的名称。基本类型如 "int" 会落到这里。
-            return original_full_str
-
-        # ======================================================================
-        # correct_type_name 定义结束
-        # ======================================================================
+            registration_parts.append(f"        .property(\"{prop}\", &{fully_qualified_name}::{prop})\n")
+
+        # 修正类型名称，将简单名称替换为已知的完全限定名
+        correct_type_name = TypeNameCorrector(simple_class_name_for_self_ref, fully_qualified_name,
+                                              self.simple_to_fqn).correct
 
         for method_info in methods:
             method_name = method_info['name']
@@ -683,18 +1032,18 @@ class ReflectionGenerator:
             template_args_list = [corrected_return_type] + corrected_param_types
             template_args_str = ", ".join(template_args_list)
 
-            registration += f"        .method<{template_args_str}>(\"{method_name}\", {function_ptr_cast}&{fully_qualified_name}::{method_name})\n"
+            registration_parts.append(f"        .method<{template_args_str}>(\"{method_name}\", {function_ptr_cast}&{fully_qualified_name}::{method_name})\n")
 
         for ctor_params_orig_list in constructors:
             if not ctor_params_orig_list:
-                registration += f"        .constructor<>()\n"
+                registration_parts.append(f"        .constructor<>()\n")
             else:
                 # 使用 correct_type_name 修正原始类型字符串
                 corrected_ctor_params = [correct_type_name(pt) for pt in ctor_params_orig_list]
-                registration += f"        .constructor<{', '.join(corrected_ctor_params)}>()\n"
+                registration_parts.append(f"        .constructor<{', '.join(corrected_ctor_params)}>()\n")
 
-        registration += "    ;"
-        self.namespace_registrations[namespace].append(registration)
+        registration_parts.append("    ;")
+        self.namespace_registrations[namespace].setdefault(fully_qualified_name, "".join(registration_parts))
 
     def process_enum(self, cursor):
         """处理枚举类型"""
@@ -750,90 +1099,119 @@ class ReflectionGenerator:
             self.resolved_types.add(fully_qualified_name)
 
             # 生成枚举注册代码（不包含RTTM_REGISTRATION块）
-            registration = f"    // {enum_name} 枚举的反射注册 (基础类型: {enum_type})\n"
-            registration += f"    Enum_<{fully_qualified_name}>()\n"
+            registration_parts = [f"    // {enum_name} 枚举的反射注册 (基础类型: {enum_type})\n"]
+            registration_parts.append(f"    Enum_<{fully_qualified_name}>()\n")
 
             for value in enum_values:
                 if is_enum_class:
-                    registration += f"        .value(\"{value}\", {fully_qualified_name}::{value})\n"
+                    registration_parts.append(f"        .value(\"{value}\", {fully_qualified_name}::{value})\n")
                 else:
                     # 对于普通枚举，使用完全限定名访问枚举值
-                    registration += f"        .value(\"{value}\", {fully_qualified_name}::{value})\n"
+                    registration_parts.append(f"        .value(\"{value}\", {fully_qualified_name}::{value})\n")
 
-            registration += "    ;"
-            self.namespace_registrations[namespace].append(registration)
+            registration_parts.append("    ;")
+            self.namespace_registrations[namespace].setdefault(fully_qualified_name, "".join(registration_parts))
 
     def generate(self):
         """生成反射代码文件"""
         try:
-            with open(self.output_file, 'w') as f:
-                # 写入包含文件
-                f.write("#include <RTTM/RTTM.hpp>\n")  # 使用尖括号包含
-
-                # 添加所有处理过的头文件
-                for header in sorted(self.processed_files):
-                    f.write(f"#include \"{header}\"\n")
-                f.write("\n")
-
-                f.write("// 自动生成的反射注册代码，请勿修改\n")
-                f.write("// 此代码仅包含头文件中直接定义的类型，不包含外部库引用\n")
-                f.write("// 注意：私有成员、保护成员、静态成员变量和静态方法已被排除\n")
-                f.write("// 普通模板类被排除，但模板特化会被包含\n")
-                f.write("// 所有非公开的嵌套类型都被排除，包括嵌套在非公开类型中的公开类型\n")
-                f.write("using namespace RTTM;\n\n")
-
-                # 添加外部类型注释
-                if self.external_types:
-                    f.write("// 以下外部类型被排除在反射之外:\n")
-                    for ext_type in sorted(self.external_types):
-                        f.write(f"// - {ext_type}\n")
-                    f.write("\n")
-
-                # 添加跳过类型的注释
-                if self.skipped_types:
-                    f.write("// 以下类型在处理过程中被跳过:\n")
-                    for skipped in self.skipped_types:
-                        f.write(f"// - {skipped}\n")
-                    f.write("\n")
-
-                # 按命名空间组织的所有类型注册代码
-                all_registrations = {}
-                for namespace, registrations in self.namespace_registrations.items():
-                    all_registrations[namespace] = registrations
-
-                # 检查是否有需要注册的类型
-                has_types_to_register = any(registrations for registrations in all_registrations.values())
-
-                if has_types_to_register:
-                    # 全局注册块
-                    f.write("RTTM_REGISTRATION {\n")
-
-                    # 首先处理全局命名空间的注册
-                    if "" in all_registrations and all_registrations[""]:
-                        for code in all_registrations[""]:
-                            f.write(f"{code}\n\n")
-
-                    # 然后按命名空间组织写入其他注册代码
-                    for namespace, registrations in sorted(all_registrations.items()):
-                        if namespace == "":  # 已经处理过全局命名空间
-                            continue
-
-                        if registrations:
-                            f.write(f"    // {namespace} 命名空间中的类型\n")
-                            for code in registrations:
-                                f.write(f"{code}\n\n")
-
-                    f.write("}\n")
-                else:
-                    f.write("// 未找到需要反射的类型\n")
+            output_parts = []
+
+            # 写入包含文件
+            output_parts.append("#include <RTTM/RTTM.hpp>\n")  # 使用尖括号包含
+
+            # 添加所有处理过的头文件，使用相对于输出文件所在目录的路径
+            output_dir = os.path.dirname(os.path.abspath(self.output_file))
+            include_paths = set()
+            for header in self.processed_files:
+                try:
+                    include_paths.add(os.path.relpath(header, start=output_dir).replace(os.sep, '/'))
+                except ValueError:
+                    # Windows下头文件与输出文件不在同一驱动器时无法使用相对路径
+                    include_paths.add(header)
+            for header in sorted(include_paths):
+                output_parts.append(f"#include \"{header}\"\n")
+            output_parts.append("\n")
+
+            output_parts.append("// 自动生成的反射注册代码，请勿修改\n")
+            output_parts.append("// 此代码仅包含头文件中直接定义的类型，不包含外部库引用\n")
+            output_parts.append("// 注意：私有成员、保护成员、静态成员变量和静态方法已被排除\n")
+            output_parts.append("// 普通模板类被排除，但模板特化会被包含\n")
+            output_parts.append("// 所有非公开的嵌套类型都被排除，包括嵌套在非公开类型中的公开类型\n")
+            output_parts.append("using namespace RTTM;\n\n")
+
+            # 添加外部类型注释
+            if self.external_types:
+                output_parts.append("// 以下外部类型被排除在反射之外:\n")
+                output_parts.extend(f"// - {ext_type}\n" for ext_type in sorted(self.external_types))
+                output_parts.append("\n")
+
+            # 添加跳过类型的注释
+            if self.skipped_types:
+                output_parts.append("// 以下类型在处理过程中被跳过:\n")
+                output_parts.extend(f"// - {skipped}\n" for skipped in self.skipped_types)
+                output_parts.append("\n")
+
+            # 按命名空间组织的所有类型注册代码
+            all_registrations = self.namespace_registrations
+
+            # 检查是否有需要注册的类型
+            has_types_to_register = any(registrations for registrations in all_registrations.values())
+
+            if has_types_to_register:
+                # 全局注册块
+                output_parts.append("RTTM_REGISTRATION {\n")
+
+                # 首先处理全局命名空间的注册
+                if "" in all_registrations and all_registrations[""]:
+                    output_parts.extend(f"{code}\n\n" for code in all_registrations[""].values())
+
+                # 然后按命名空间组织写入其他注册代码
+                for namespace, registrations in sorted(all_registrations.items()):
+                    if namespace == "":  # 已经处理过全局命名空间
+                        continue
+
+                    if registrations:
+                        output_parts.append(f"    // {namespace} 命名空间中的类型\n")
+                        output_parts.extend(f"{code}\n\n" for code in registrations.values())
+
+                output_parts.append("}\n")
+            else:
+                output_parts.append("// 未找到需要反射的类型\n")
 
-                print(f"成功生成反射代码: {self.output_file}")
-                return True
+            # 一次性写入同目录下的临时文件再替换，生成失败时不会留下不完整的输出文件
+            # 固定使用UTF-8编码和\n换行，不做换行转换，输出内容与平台和区域设置无关
+            tmp_file = f"{self.output_file}.tmp"
+            try:
+                with open(tmp_file, 'w', encoding='utf-8', newline='\n', buffering=1 << 20) as f:
+                    f.writelines(output_parts)
+                os.replace(tmp_file, self.output_file)
+            except BaseException:
+                try:
+                    os.unlink(tmp_file)
+                except OSError:
+                    pass
+                raise
+
+            print(f"成功生成反射代码: {self.output_file}")
+            return True
         except Exception as e:
             print(f"生成反射代码失败: {e}", file=sys.stderr)
             return False
 
 
+def process_header_task(output_file, compile_options_file, include_paths, use_cache, compile_options, pch_options,
+                        task):
+    """在新建的生成器中处理单个头文件，返回 (是否成功, 处理结果)，可在子进程中执行"""
+    processed_files, header_file = task
+    generator = ReflectionGenerator(output_file, compile_options_file, include_paths, use_cache)
+    generator.processed_files.update(map(sys.intern, processed_files))
+    generator.compile_options = compile_options
+    generator.pch_options = pch_options
+    success = generator.process_header(header_file)
+    return success, generator.export_result()
+
+
 def parse_args():
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description='生成C++类的反射代码')
@@ -846,6 +1224,10 @@ def parse_args():
     parser.add_argument('--output', dest='output_file', required=True, help='输出文件路径')
     parser.add_argument('--options', dest='compile_options_file', help='编译选项文件路径')
     parser.add_argument('--include-paths', dest='include_paths', help='包含路径，以逗号分隔')
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false', help='禁用解析结果缓存')
+    parser.add_argument('-j', '--jobs', type=int, help='并行处理头文件的进程数，默认为CPU核心数')
+    parser.add_argument('--single-tu', action='store_true',
+                        help='将头文件列表合并为一个翻译单元解析（不并行；列表中其他头文件的类型不再视为外部类型）')
 
     # 兼容旧的位置参数格式
     parser.add_argument('old_output_file', nargs='?', help='旧格式的输出文件参数')
@@ -870,7 +1252,8 @@ def main():
     generator = ReflectionGenerator(
         args.output_file,
         args.compile_options_file or args.old_compile_options_file,
-        include_paths
+        include_paths,
+        args.use_cache
     )
 
     # 处理头文件
@@ -886,14 +1269,13 @@ def main():
 
         print(f"从 {args.headers_list} 读取了 {len(headers)} 个头文件")
 
-        success = True
-        for header in headers:
-            if not generator.process_header(header):
-                success = False
-                print(f"警告: 处理 {header} 时出现错误", file=sys.stderr)
+        if args.single_tu:
+            success = generator.process_headers_single_tu(headers)
+        else:
+            success = generator.process_headers(headers, args.jobs)
     else:
         # 处理单个头文件
-        success = generator.process_header(args.input_file)
+        success = generator.process_headers([args.input_file], 1)
 
     # 生成反射代码
     if generator.generate():
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""generate_reflection.py 的回归测试
+
+运行方式: python -m unittest discover -s cmake/tests
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import generate_reflection  # noqa: E402
+
+
+class ReflectionGeneratorTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def write_file(self, name, content):
+        """在临时目录中写入文件，返回其路径"""
+        path = os.path.join(self.temp_dir.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def generate(self, headers, jobs=1):
+        """逐个头文件处理并生成反射代码，返回生成的文件内容"""
+        output_file = os.path.join(self.temp_dir.name, 'reflection.cpp')
+        generator = generate_reflection.ReflectionGenerator(output_file, use_cache=False)
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            self.assertTrue(generator.process_headers(headers, jobs))
+            self.assertTrue(generator.generate())
+        with open(output_file, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_types_defined_in_member_declarations(self):
+        """在成员或 typedef 声明中定义的嵌套类型使用其所在访问修饰符块的权限"""
+        header = self.write_file('decls.hpp', """
+#pragma once
+struct S1 { private: struct P { int a; } p; public: int x; };
+struct S2 { private: typedef struct R { int b; } R_t; public: int y; };
+class C1 { public: struct Q { int c; } q; };
+class C2 { public: typedef struct T { int d; } T_t; enum class EE { A } ee; };
+""")
+        output = self.generate([header])
+
+        for name in ('S1', 'S2', 'C1', 'C1::Q', 'C2', 'C2::T'):
+            self.assertIn(f"Registry_<{name}>()", output)
+        self.assertIn("Enum_<C2::EE>()", output)
+        self.assertNotIn("Registry_<S1::P>", output)
+        self.assertNotIn("Registry_<S2::R>", output)
+
+    def test_external_types_are_per_header(self):
+        """外部类型名称只用于排除同一头文件中的成员，结果与并行度无关"""
+        self.write_file('ext/include/widget.hpp', "#pragma once\nstruct Widget { int w; };\n")
+        first = self.write_file('first.hpp', """
+#pragma once
+#include "ext/include/widget.hpp"
+struct Panel { Widget widget; int size; };
+""")
+        second = self.write_file('second.hpp', """
+#pragma once
+struct WidgetBox { int n; };
+struct User { WidgetBox box; };
+""")
+        output = self.generate([first, second])
+
+        # first.hpp 中引用外部类型 Widget 的成员被排除
+        self.assertNotIn('.property("widget"', output)
+        self.assertIn('.property("size", &Panel::size)', output)
+        # second.hpp 的解析中没有外部类型 Widget，WidgetBox 成员不受影响
+        self.assertIn('.property("box", &User::box)', output)
+
+        self.assertEqual(output, self.generate([first, second], jobs=2))
+
+
+if __name__ == '__main__':
+    unittest.main()